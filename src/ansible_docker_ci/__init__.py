@@ -1,3 +1,12 @@
 """Docker image-based dynamic hosts for ansible"""
 
-from .version import __version__
+
+def __getattr__(name: str) -> str:
+    """Resolve the package version lazily: importlib.metadata scans installed
+    distributions metadata, which is a needless import-time cost otherwise"""
+    if name == "__version__":
+        # pylint: disable=import-outside-toplevel
+        from .version import __version__ as package_version
+
+        return package_version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,23 @@
 """Docker image-based connection plugin to make temporary containers"""
 import functools
+import hashlib
 import io
 import os
+import shlex
 import shutil
+import socket
+import struct
 import tarfile
 import typing as t
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 from ansible.errors import AnsibleFileNotFound, AnsibleConnectionFailure  # type: ignore
 from ansible.plugins.connection import ConnectionBase  # type: ignore
 from ansible.plugins.strategy import StrategyBase  # type: ignore
 from class_interference import Extension, inject, apply_extensions
 from docker.client import DockerClient  # type: ignore
+from docker.errors import APIError, NotFound  # type: ignore
 from docker.models.containers import Container  # type: ignore
 
 __all__ = [
@@ -45,6 +52,146 @@ options:
 """
 
 
+# Concurrent strategies may run many execs at once over the shared client,
+# so keep enough pooled daemon connections to avoid per-request socket setups
+_CLIENT_MAX_POOL_SIZE: int = 64
+# A pinned API version skips the server version negotiation round-trip
+# performed by from_env; overridable the usual docker SDK way
+_CLIENT_API_VERSION: str = os.environ.get("DOCKER_API_VERSION", "1.41")
+
+
+_SHARED_CLIENTS: t.Dict[t.Type[DockerClient], DockerClient] = {}
+
+
+def _get_shared_client(client_class: t.Type[DockerClient]) -> DockerClient:
+    """Prepare a single docker client per client class, shared by all plugin consumers"""
+    if client_class not in _SHARED_CLIENTS:
+        _SHARED_CLIENTS[client_class] = client_class.from_env(
+            version=_CLIENT_API_VERSION,
+            max_pool_size=_CLIENT_MAX_POOL_SIZE,
+        )
+    return _SHARED_CLIENTS[client_class]
+
+
+class ArchiveStreamReader:
+    """Minimal file-like adapter over a bytes chunk iterator,
+    allowing tarfile stream reads without full buffering"""
+
+    def __init__(self, chunks: t.Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer: bytes = b""
+
+    def read(self, size: int = -1) -> bytes:
+        """Consume up to `size` bytes from the underlying iterator (everything left, if negative)"""
+        parts: t.List[bytes] = [self._buffer]
+        total_length: int = len(self._buffer)
+        while size < 0 or total_length < size:
+            try:
+                chunk: bytes = next(self._chunks)
+            except StopIteration:
+                break
+            parts.append(chunk)
+            total_length += len(chunk)
+        # A single join concatenates all collected chunks in one C-level pass
+        data: bytes = b"".join(parts)
+        if size < 0:
+            result, self._buffer = data, b""
+        else:
+            result, self._buffer = data[:size], data[size:]
+        return result
+
+
+class ShellSession:
+    """Long-lived `sh` process inside a container, multiplexing task commands
+    over a single exec socket instead of spawning one exec instance per command"""
+
+    _STDERR_STREAM_TYPE: int = 2
+    _FRAME_HEADER_LENGTH: int = 8
+
+    def __init__(self, docker_socket: t.Any) -> None:
+        self._docker_socket = docker_socket
+        self._socket: socket.socket = docker_socket._sock  # pylint: disable=protected-access
+        # Commands may legitimately outlive the docker client's request timeout
+        self._socket.settimeout(None)
+
+    def send_command(self, cmd: str) -> str:
+        """Feed a command to the shell, returning the sentinel that delimits its output"""
+        sentinel: str = uuid.uuid4().hex
+        # Quote the command into a single inner `sh -c` token with stdin detached:
+        # the session shell parses complete lines only, so a malformed command fails
+        # inside the inner shell instead of consuming the sentinel lines as
+        # continuation input or killing the session. Each output stream then gets its
+        # own uniquely delimited terminator (carrying the exit code on stdout).
+        payload: str = (
+            f"sh -c {shlex.quote(cmd)} </dev/null\n"
+            f"printf '\\n%s %s\\n' {sentinel} \"$?\"\n"
+            f"printf '\\n%s\\n' {sentinel} >&2\n"
+        )
+        self._socket.sendall(payload.encode())
+        return sentinel
+
+    def read_result(self, sentinel: str) -> t.Tuple[int, bytes, bytes]:
+        """Collect the exit code and demuxed output of the last sent command"""
+        # The daemon muxes stdout and stderr independently, so stderr bytes may
+        # arrive after the stdout sentinel: wait for both stream terminators
+        # before returning to avoid dropping or mis-attributing late frames
+        stdout_marker: bytes = f"\n{sentinel} ".encode()
+        stderr_marker: bytes = f"\n{sentinel}\n".encode()
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code: t.Optional[int] = None
+        stdout_length: int = 0
+        stderr_length: t.Optional[int] = None
+        while exit_code is None or stderr_length is None:
+            stream_type, frame = self._read_frame()
+            if stream_type == self._STDERR_STREAM_TYPE:
+                stderr += frame
+                stderr_marker_position: int = stderr.find(stderr_marker)
+                if stderr_marker_position >= 0:
+                    stderr_length = stderr_marker_position
+                continue
+            stdout += frame
+            if exit_code is not None:
+                continue
+            marker_position: int = stdout.find(stdout_marker)
+            if marker_position < 0:
+                continue
+            status_line_end: int = stdout.find(b"\n", marker_position + len(stdout_marker))
+            if status_line_end < 0:
+                # The exit code line is not complete yet
+                continue
+            exit_code = int(stdout[marker_position + len(stdout_marker) : status_line_end])
+            stdout_length = marker_position
+        return exit_code, bytes(stdout[:stdout_length]), bytes(stderr[:stderr_length])
+
+    def _read_frame(self) -> t.Tuple[int, bytes]:
+        """Receive one frame of the docker stream multiplexing protocol"""
+        header: bytes = self._read_exactly(self._FRAME_HEADER_LENGTH)
+        stream_type, frame_length = struct.unpack(">BxxxL", header)
+        return stream_type, self._read_exactly(frame_length)
+
+    def _read_exactly(self, length: int) -> bytes:
+        parts: t.List[bytes] = []
+        while length:
+            chunk: bytes = self._socket.recv(length)
+            if not chunk:
+                raise AnsibleConnectionFailure("Shell session closed unexpectedly")
+            parts.append(chunk)
+            length -= len(chunk)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        """Terminate the shell and release the socket"""
+        try:
+            self._socket.sendall(b"exit\n")
+        except OSError:
+            pass
+        try:
+            self._docker_socket.close()
+        except OSError:
+            pass
+
+
 class Connection(ConnectionBase):
     """Local docker based connections"""
 
@@ -54,6 +201,11 @@ class Connection(ConnectionBase):
     DOCKER_CLIENT_CLASS: t.Type[DockerClient] = DockerClient
     _CONTAINER_PID_LABEL: str = "ansible.docker.image.connection.temp_container.parent.pid"
     _CONTAINER_HOSTNAME_LABEL: str = "ansible.docker.image.connection.temp_container.host.name"
+    _CONTAINER_NAME_PREFIX: str = "ansible-docker-ci"
+    # Large file copies are dominated by the python-level chunk loop, thus use sizeable chunks
+    _COPY_CHUNK_SIZE: int = 2 * 1024 * 1024
+    # Files below this size skip tar construction and go straight over an exec stdin pipe
+    _SMALL_FILE_THRESHOLD: int = 1024 * 1024
 
     @classmethod
     def list_matching_containers(cls, pid: t.Union[int, str], hostname: t.Optional[str] = None) -> t.List[Container]:
@@ -62,7 +214,7 @@ class Connection(ConnectionBase):
         labels: t.List[str] = [f"{cls._CONTAINER_PID_LABEL}={pid}"]
         if hostname is not None:
             labels.append(f"{cls._CONTAINER_HOSTNAME_LABEL}={hostname}")
-        return cls.DOCKER_CLIENT_CLASS.from_env().containers.list(filters={"label": labels})
+        return _get_shared_client(cls.DOCKER_CLIENT_CLASS).containers.list(filters={"label": labels})
 
     # pylint: disable=keyword-arg-before-vararg
     def __init__(self, play_context, new_stdin, shell=None, *args, **kwargs):
@@ -70,24 +222,31 @@ class Connection(ConnectionBase):
         self._client: t.Optional[DockerClient] = None
         self._playbook_pid: str = kwargs["ansible_playbook_pid"]
         self._container: t.Optional[Container] = None
+        self._shell_session: t.Optional[ShellSession] = None
 
     @functools.cached_property
     def client(self) -> DockerClient:
-        """Prepare docker client, if none was created before"""
-        return self.DOCKER_CLIENT_CLASS.from_env()
+        """Obtain the shared docker client"""
+        return _get_shared_client(self.DOCKER_CLIENT_CLASS)
+
+    @classmethod
+    def _make_container_name(cls, pid: t.Union[int, str], hostname: str) -> str:
+        """Deterministic container name for a playbook run/host pair"""
+        hostname_digest: str = hashlib.sha256(hostname.encode()).hexdigest()[:12]
+        return f"{cls._CONTAINER_NAME_PREFIX}-{pid}-{hostname_digest}"
 
     @functools.cached_property
     def container(self) -> Container:
         """Find matching container, if any, or create it"""
-        possible_host_containers: t.List[Container] = self.list_matching_containers(
-            pid=self._playbook_pid,
-            hostname=self.hostname,
-        )
-        return (
-            possible_host_containers[0]
-            if possible_host_containers
-            else self.client.containers.run(
+        container_name: str = self._make_container_name(pid=self._playbook_pid, hostname=self.hostname)
+        try:
+            return self.client.containers.get(container_name)
+        except NotFound:
+            pass
+        try:
+            return self.client.containers.run(
                 image=self.image,
+                name=container_name,
                 command="sh -c 'while :; do sleep 1; done'",
                 remove=True,
                 detach=True,
@@ -96,7 +255,12 @@ class Connection(ConnectionBase):
                     self._CONTAINER_HOSTNAME_LABEL: self.hostname,
                 },
             )
-        )
+        except APIError as api_error:
+            # Another worker may have won the creation race:
+            # the name uniqueness constraint rejects the duplicate
+            if api_error.status_code == 409:
+                return self.client.containers.get(container_name)
+            raise
 
     def _connect(self) -> None:
         """Create a container and connect to it"""
@@ -116,56 +280,196 @@ class Connection(ConnectionBase):
         """Ansible hostname"""
         return self.get_option("host")
 
+    @functools.cached_property
+    def _container_uid_gid(self) -> t.Tuple[int, int]:
+        """Uid/gid pair of the default exec user, obtained once per container"""
+        # /proc/self is owned by the exec process itself, so a single stat invocation
+        # replaces two id forks; -L dereferences the magic symlink, whose own inode
+        # always belongs to root. Images lacking stat fall back to the id pair.
+        exit_code, id_command_stdout, id_command_stderr = self.exec_command(
+            "stat -Lc '%u %g' /proc/self 2>/dev/null || { id -u && id -g; }"
+        )
+        if exit_code:
+            raise AnsibleConnectionFailure(f"Couldn't obtain uid/gid: {id_command_stderr!r}")
+        user_id, group_id = map(int, id_command_stdout.split())
+        return user_id, group_id
+
+    def _get_shell_session(self) -> ShellSession:
+        """Lazily start the persistent in-container shell"""
+        if self._shell_session is None:
+            exec_data: t.Dict[str, t.Any] = self.client.api.exec_create(
+                self.container.id,
+                ["sh"],
+                stdout=True,
+                stderr=True,
+                stdin=True,
+                tty=False,
+            )
+            docker_socket = self.client.api.exec_start(
+                exec_id=exec_data["Id"],
+                detach=False,
+                stream=False,
+                socket=True,
+                demux=False,
+            )
+            self._shell_session = ShellSession(docker_socket)
+        return self._shell_session
+
+    def _reset_shell_session(self) -> None:
+        """Close the persistent shell, if any"""
+        if self._shell_session is not None:
+            self._shell_session.close()
+            self._shell_session = None
+
     def exec_command(self, cmd: str, in_data: t.Any = None, sudoable: bool = False) -> t.Tuple[int, bytes, bytes]:
         """Run a command in the container"""
         if in_data is not None:
             raise AnsibleConnectionFailure("`in_data` is not supported yet")
         super().exec_command(cmd, in_data=in_data, sudoable=sudoable)
-        exec_data: t.Dict[str, t.Any] = self.client.api.exec_create(
-            self.container.id,
+        try:
+            session: ShellSession = self._get_shell_session()
+            sentinel: str = session.send_command(cmd)
+        except (OSError, AnsibleConnectionFailure):
+            # The command has not started yet, so running it in isolation is safe
+            self._reset_shell_session()
+            return self._exec_command_isolated(cmd)
+        try:
+            return session.read_result(sentinel)
+        except AnsibleConnectionFailure:
+            self._reset_shell_session()
+            raise
+        except (OSError, ValueError) as session_error:
+            # The command may have produced side effects already:
+            # surface the failure instead of risking a double execution
+            self._reset_shell_session()
+            raise AnsibleConnectionFailure(
+                f"Shell session failed reading command result: {session_error}"
+            ) from session_error
+
+    def _exec_command_isolated(self, cmd: str) -> t.Tuple[int, bytes, bytes]:
+        """Run a command in a one-off exec instance"""
+        exit_code, (stdout, stderr) = self.container.exec_run(
             ["sh", "-c", cmd],
             stdout=True,
             stderr=True,
             stdin=False,
-        )
-        exec_id: str = exec_data["Id"]
-        stdout, stderr = self.client.api.exec_start(
-            exec_id=exec_id,
-            detach=False,
-            stream=False,
-            socket=False,
             demux=True,
         )
-        result: t.Dict[str, t.Any] = self.client.api.exec_inspect(exec_id)
-        return result.get("ExitCode") or 0, stdout or b"", stderr or b""
+        return exit_code or 0, stdout or b"", stderr or b""
 
     def put_file(self, in_path: str, out_path: str) -> None:
         """Send a file to the container"""
         super().put_file(in_path, out_path)
         if not out_path.startswith("/"):
             raise AnsibleConnectionFailure("Only absolute paths are available")
-        if not os.path.exists(in_path):
-            raise AnsibleFileNotFound(in_path)
+        try:
+            # A single stat call covers the existence check, the size-based
+            # strategy choice and the tar header fields below
+            file_stat: os.stat_result = os.stat(in_path)
+        except OSError as stat_error:
+            raise AnsibleFileNotFound(in_path) from stat_error
 
-        exit_code, id_command_stdout, id_command_stderr = self.exec_command("id -u && id -g")
-        if exit_code:
-            raise AnsibleConnectionFailure(f"Couldn't obtain uid/gid: {id_command_stderr!r}")
-        user_id, group_id = map(int, id_command_stdout.splitlines())
+        user_id, group_id = self._container_uid_gid
+        if file_stat.st_size < self._SMALL_FILE_THRESHOLD:
+            self._put_file_via_exec(in_path, out_path, file_stat=file_stat, user_id=user_id, group_id=group_id)
+        else:
+            self._put_file_via_archive(in_path, out_path, file_stat=file_stat, user_id=user_id, group_id=group_id)
+
+    def _put_file_via_exec(
+        self,
+        in_path: str,
+        out_path: str,
+        file_stat: os.stat_result,
+        user_id: int,
+        group_id: int,
+    ) -> None:
+        """Pipe raw file bytes into the container over an exec stdin socket.
+        Cheaper than the tar round-trip for small files."""
+        file_mode: int = file_stat.st_mode & 0o700
+        quoted_out_path: str = shlex.quote(out_path)
+        receive_command: str = (
+            f"cat > {quoted_out_path}"
+            f" && chown {user_id}:{group_id} {quoted_out_path}"
+            f" && chmod {file_mode:o} {quoted_out_path}"
+        )
+        exec_data: t.Dict[str, t.Any] = self.client.api.exec_create(
+            self.container.id,
+            ["sh", "-c", receive_command],
+            stdout=True,
+            stderr=True,
+            stdin=True,
+        )
+        exec_id: str = exec_data["Id"]
+        sock = self.client.api.exec_start(
+            exec_id=exec_id,
+            detach=False,
+            stream=False,
+            socket=True,
+            demux=False,
+        )
+        raw_socket: socket.socket = sock._sock  # pylint: disable=protected-access
+        try:
+            with open(in_path, "rb") as f:
+                while chunk := f.read(self._COPY_CHUNK_SIZE):
+                    raw_socket.sendall(chunk)
+            # Half-close delivers EOF to `cat`; then drain until the exec process finishes
+            raw_socket.shutdown(socket.SHUT_WR)
+            while raw_socket.recv(io.DEFAULT_BUFFER_SIZE):
+                pass
+        finally:
+            sock.close()
+        result: t.Dict[str, t.Any] = self.client.api.exec_inspect(exec_id)
+        if result.get("ExitCode"):
+            raise AnsibleConnectionFailure(f"Unknown error while sending file {out_path!r}")
+
+    def _put_file_via_archive(
+        self,
+        in_path: str,
+        out_path: str,
+        file_stat: os.stat_result,
+        user_id: int,
+        group_id: int,
+    ) -> None:
+        """Send a file to the container as a single-member tar archive"""
         out_dir, out_file = os.path.split(out_path)
         stream = io.BytesIO()
-        with tarfile.open(fileobj=stream, mode="w", dereference=True, encoding="utf-8") as archive:
-            tarinfo = archive.gettarinfo(name=in_path, arcname=out_file)
+        with tarfile.open(fileobj=stream, mode="w", encoding="utf-8") as archive:
+            # Build the member info straight from the known stat result,
+            # sparing gettarinfo's extra stat call and path handling
+            tarinfo = tarfile.TarInfo(name=out_file)
+            tarinfo.type = tarfile.REGTYPE
+            tarinfo.size = file_stat.st_size
+            tarinfo.mtime = int(file_stat.st_mtime)
+            tarinfo.mode = file_stat.st_mode & 0o700
             tarinfo.uid = user_id
-            tarinfo.uname = ""
             tarinfo.gid = group_id
-            tarinfo.gname = ""
-            tarinfo.mode &= 0o700
             with open(in_path, "rb") as f:
-                archive.addfile(tarinfo, fileobj=f)
+                # Emit the member manually: tarfile.addfile copies in 16 KiB chunks,
+                # while a 2 MiB buffer amortizes interpreter overhead and syscalls
+                header: bytes = tarinfo.tobuf(archive.format, archive.encoding, archive.errors)
+                stream.write(header)
+                # Copy exactly the size committed to the header: the source may
+                # grow or shrink in between, which would corrupt the archive layout
+                remaining: int = tarinfo.size
+                while remaining:
+                    chunk: bytes = f.read(min(self._COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise AnsibleConnectionFailure(f"Source file truncated during transfer: {in_path!r}")
+                    stream.write(chunk)
+                    remaining -= len(chunk)
+                data_blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+                if remainder:
+                    stream.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+                    data_blocks += 1
+                archive.offset += len(header) + data_blocks * tarfile.BLOCKSIZE
+                archive.members.append(tarinfo)  # type: ignore
+        # Rewind and send the buffer as a file-like object: requests streams it in chunks,
+        # which spares a full in-memory copy of the archive
+        stream.seek(0)
         put_successful: bool = self.client.api.put_archive(
             container=self.container.id,
             path=out_dir,
-            data=stream.getvalue(),
+            data=stream,
         )
         if not put_successful:
             raise AnsibleConnectionFailure(f"Unknown error while sending file {out_path!r}")
@@ -175,39 +479,36 @@ class Connection(ConnectionBase):
         super().fetch_file(in_path, out_path)
         if not out_path.startswith("/"):
             raise AnsibleConnectionFailure("Only absolute paths are available")
-        known_in_paths = set()
-
-        while True:
-            if in_path in known_in_paths:
-                raise AnsibleConnectionFailure(f"Found infinite symbolic link loop: {in_path!r}")
-            known_in_paths.add(in_path)
-            archive_stream, _ = self.client.api.get_archive(
-                container=self.container.id,
-                path=in_path,
-            )
-            stream = io.BytesIO()
-            for chunk in archive_stream:
-                stream.write(chunk)
-            stream.seek(0)
-            with tarfile.open(fileobj=stream, mode="r") as archive:
-                members: t.List[tarfile.TarInfo] = list(archive)
-                if len(members) != 1:
-                    raise AnsibleConnectionFailure(f"Bad members length: {len(members)}")
-                member: tarfile.TarInfo = members[0]
-                if member.issym():
-                    in_path = os.path.join(os.path.split(in_path)[0], member.linkname)
-                    continue
-                if not member.isfile():
-                    raise AnsibleConnectionFailure(f"Bad member: {in_path!r}")
-                in_f: t.Optional[t.IO[bytes]] = archive.extractfile(member)
-                if in_f is None:
-                    raise AnsibleConnectionFailure(f"No member: {member}")
-                with open(out_path, "wb") as out_f:
-                    shutil.copyfileobj(in_f, out_f, member.size)
-                return
+        # Canonicalize the path on the container side: a single readlink call replaces
+        # one get_archive round-trip per symbolic link hop, and detects link loops itself
+        readlink_code, readlink_stdout, _ = self.exec_command(f"readlink -f {shlex.quote(in_path)}")
+        if not readlink_code and readlink_stdout.strip():
+            in_path = readlink_stdout.strip().decode()
+        archive_stream, _ = self.client.api.get_archive(
+            container=self.container.id,
+            path=in_path,
+        )
+        # Streaming mode extracts as bytes arrive, holding one chunk in memory at a time
+        reader = ArchiveStreamReader(iter(archive_stream))
+        with tarfile.open(fileobj=reader, mode="r|", bufsize=self._COPY_CHUNK_SIZE) as archive:  # type: ignore
+            member: t.Optional[tarfile.TarInfo] = archive.next()
+            if member is None:
+                raise AnsibleConnectionFailure(f"Empty archive received for path: {in_path!r}")
+            if not member.isfile():
+                raise AnsibleConnectionFailure(f"Bad member: {in_path!r}")
+            in_f: t.Optional[t.IO[bytes]] = archive.extractfile(member)
+            if in_f is None:
+                raise AnsibleConnectionFailure(f"No member: {member}")
+            with open(out_path, "wb") as out_f:
+                shutil.copyfileobj(in_f, out_f, self._COPY_CHUNK_SIZE)
+            # One extra header probe confirms the single-member expectation
+            # without materializing the whole archive listing
+            if archive.next() is not None:
+                raise AnsibleConnectionFailure(f"Too many archive members for path: {in_path!r}")
 
     def close(self):
         # Do not terminate containers: they would be stopped on strategy plugin cleanup
+        self._reset_shell_session()
         self._connected = False
 
 
@@ -217,9 +518,12 @@ class StrategyBaseExtension(StrategyBase, Extension):
     @inject
     def cleanup(self):
         self.super_ext.cleanup()
-        # Remove all playbook-matching containers
-        for container in Connection.list_matching_containers(pid=os.getpid()):  # type: Container
-            container.remove(force=True)
+        # Remove all playbook-matching containers concurrently: each removal is a blocking
+        # docker API call, and the daemon processes them independently
+        containers: t.List[Container] = Connection.list_matching_containers(pid=os.getpid())
+        if containers:
+            with ThreadPoolExecutor(max_workers=min(32, len(containers))) as executor:
+                list(executor.map(lambda container: container.remove(force=True), containers))
 
 
 # Patch strategy class
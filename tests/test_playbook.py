@@ -1,5 +1,6 @@
 """Ansible docker image runner tests"""
 # pylint: disable=redefined-outer-name
+import io
 import os
 import typing as t
 from pathlib import Path
@@ -8,6 +9,17 @@ from tempfile import TemporaryDirectory
 import pytest
 import yaml
 from ansible.cli.playbook import PlaybookCLI  # type: ignore
+from docker.client import DockerClient  # type: ignore
+
+# File transfer payloads on both sides of the connection plugin small-file threshold
+SMALL_FILE_SIZE: int = 4 * 1024
+LARGE_FILE_SIZE: int = 2 * 1024 * 1024
+PYTHON_IMAGE: str = "python:alpine"
+NON_ROOT_DOCKERFILE: bytes = b"""
+FROM python:alpine
+RUN adduser -D ansible-ci
+USER ansible-ci
+"""
 
 
 class AnsibleTestRunner(t.Protocol):
@@ -49,6 +61,55 @@ def ansible_runner(temp_ansible_dir: Path) -> AnsibleTestRunner:
     return runner
 
 
+@pytest.fixture
+def transfer_files(temp_ansible_dir: Path) -> t.Tuple[Path, Path]:
+    """Prepare source payloads on both sides of the small-file threshold"""
+    small_file: Path = temp_ansible_dir / "small.bin"
+    large_file: Path = temp_ansible_dir / "large.bin"
+    small_file.write_bytes(os.urandom(SMALL_FILE_SIZE))
+    large_file.write_bytes(os.urandom(LARGE_FILE_SIZE))
+    return small_file, large_file
+
+
+@pytest.fixture(scope="session")
+def non_root_image() -> str:
+    """Build a python-capable image whose default user is not root"""
+    image, _ = DockerClient.from_env().images.build(fileobj=io.BytesIO(NON_ROOT_DOCKERFILE), rm=True)
+    return image.id
+
+
+def _run_transfer_checks(ansible_runner: AnsibleTestRunner, image: str, transfer_files: t.Tuple[Path, Path]) -> None:
+    """Copy both payloads into a container, fetch them back and compare contents"""
+    small_file, large_file = transfer_files
+    tasks: t.List[dict] = []
+    for source in (small_file, large_file):
+        tasks.append({"copy": {"src": str(source), "dest": f"/tmp/{source.name}"}})
+        tasks.append({"fetch": {"src": f"/tmp/{source.name}", "dest": f"fetched-{source.name}", "flat": "yes"}})
+    ansible_runner(
+        inventory={
+            "all": {
+                "hosts": {
+                    "foobar": {
+                        "ansible_connection": "docker_image",
+                        "ansible_docker_image": image,
+                        "ansible_python_interpreter": "/usr/local/bin/python3",
+                    },
+                },
+            },
+        },
+        playbook=[
+            {
+                "hosts": "all",
+                "gather_facts": "no",
+                "tasks": tasks,
+            },
+        ],
+    )
+    for source in (small_file, large_file):
+        fetched_file: Path = source.parent / f"fetched-{source.name}"
+        assert fetched_file.read_bytes() == source.read_bytes()
+
+
 def test_runner(ansible_runner: AnsibleTestRunner):
     """Check base plugin usage"""
     ansible_runner(
@@ -77,3 +138,18 @@ def test_runner(ansible_runner: AnsibleTestRunner):
             },
         ],
     )
+
+
+def test_file_transfer(ansible_runner: AnsibleTestRunner, transfer_files: t.Tuple[Path, Path]):
+    """Check copy/fetch round-trips across the small-file threshold"""
+    _run_transfer_checks(ansible_runner, PYTHON_IMAGE, transfer_files)
+
+
+def test_non_root_file_transfer(
+    ansible_runner: AnsibleTestRunner,
+    transfer_files: t.Tuple[Path, Path],
+    non_root_image: str,
+):
+    """Check file transfers under a non-root container default user,
+    which exercises the uid/gid probe and ownership handling"""
+    _run_transfer_checks(ansible_runner, non_root_image, transfer_files)